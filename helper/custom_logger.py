@@ -1,9 +1,17 @@
 import os
+import re
 import gzip
 import shutil
+import time
 import logging
 from logging.handlers import TimedRotatingFileHandler
-from datetime import datetime, timedelta
+
+# Rotated logs are short-lived, so favour compression speed over ratio
+GZIP_COMPRESS_LEVEL = 1
+COPY_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+# Suffix of rotated logs: the weekly rotation date ('%Y-%m-%d') moved before .log by `namer`
+ROTATED_LOG_SUFFIX = re.compile(r'\.[0-9]{4}-[0-9]{2}-[0-9]{2}\.log$')
 
 def setup_logger(log_file):
     """
@@ -22,8 +30,10 @@ def setup_logger(log_file):
     log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
     level = getattr(logging, log_level, "INFO")
         
-    logger = logging.getLogger(__name__)
+    # Use a fixed name independent of this module, and keep records away from the root logger
+    logger = logging.getLogger("ddns")
     logger.setLevel(level)
+    logger.propagate = False
 
     # TimedRotatingFileHandler to rotate every monday
     handler = TimedRotatingFileHandler(log_file, when="W0", interval=1, backupCount=0)
@@ -50,36 +60,28 @@ def compress_old_logs(log_dir, age_threshold=5, keep_count=3):
         age_threshold (int): The age in minutes after which the logs should be compressed.
         keep_count (int): The number of most recent logs to keep uncompressed.
     """
-    age_limit = datetime.now() - timedelta(minutes=age_threshold)
+    age_limit = time.time() - age_threshold * 60
     renamed_logs = []
 
     # Gather all renamed log files (those with timestamp in the filename)
-    for file_name in os.listdir(log_dir):
-        file_path = os.path.join(log_dir, file_name)
-
-        # Only consider files with the .log extension
-        if file_name.endswith('.log'):
-            try:
-                # Extract the timestamp from the filename (i.e., after the first dot)
-                timestamp_str = file_name.split('.')[1]
-                timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d_%H-%M')
-                renamed_logs.append((timestamp, file_path))
-            except (ValueError, IndexError):
-                # Skip files with unexpected naming
-                continue
-
-    # Sort logs by timestamp (oldest first)
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            # Only consider logs renamed by the rotation, skipping the active log and unrelated files
+            if ROTATED_LOG_SUFFIX.search(entry.name) and entry.is_file(follow_symlinks=False):
+                renamed_logs.append((entry.stat().st_mtime, entry.path))
+
+    # Sort logs by modification time (oldest first)
     renamed_logs.sort(key=lambda x: x[0])
 
     # If there are more logs than the `keep_count`, compress the oldest ones
     if len(renamed_logs) > keep_count:
         # Compress all logs older than the age limit
-        for timestamp, file_path in renamed_logs[:-keep_count]:  # Skip the `keep_count` newest logs
-            if timestamp < age_limit:
-                with open(file_path, 'rb') as f_in:
-                    with gzip.open(file_path + '.gz', 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                os.remove(file_path)  # Remove the original file after compression
+        for mtime, file_path in renamed_logs[:-keep_count]:  # Skip the `keep_count` newest logs
+            if mtime < age_limit:
+                with open(file_path, 'rb', buffering=COPY_BUFFER_SIZE) as f_in:
+                    with gzip.open(file_path + '.gz', 'wb', compresslevel=GZIP_COMPRESS_LEVEL) as f_out:
+                        shutil.copyfileobj(f_in, f_out, COPY_BUFFER_SIZE)
+                os.unlink(file_path)  # Remove the original file after compression
       
                 
 def delete_old_gz_logs(log_dir, age_threshold=10, keep_count=4):
@@ -91,16 +93,14 @@ def delete_old_gz_logs(log_dir, age_threshold=10, keep_count=4):
         age_threshold (int): The age in minutes after which the .gz files should be deleted.
         keep_count (int): The number of most recent .gz files to keep.
     """
-    age_limit = datetime.now() - timedelta(minutes=age_threshold)
+    age_limit = time.time() - age_threshold * 60
     gz_files = []
 
     # Gather all .gz files in the log directory
-    for file_name in os.listdir(log_dir):
-        file_path = os.path.join(log_dir, file_name)
-        
-        if file_name.endswith('.gz'):
-            file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
-            gz_files.append((file_mtime, file_path))
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.gz') and entry.is_file(follow_symlinks=False):
+                gz_files.append((entry.stat().st_mtime, entry.path))
 
     # Sort .gz files by modification time (oldest first)
     gz_files.sort(key=lambda x: x[0])
@@ -110,4 +110,4 @@ def delete_old_gz_logs(log_dir, age_threshold=10, keep_count=4):
         # Delete .gz files older than the age limit, starting from the oldest
         for mtime, file_path in gz_files[:-keep_count]:  # Skip the `keep_count` newest .gz files
             if mtime < age_limit:
-                os.remove(file_path)
+                os.unlink(file_path)
@@ -0,0 +1,44 @@
+def make_session(headers=None, **adapter_kwargs):
+    """
+    Creates a `requests` session to reuse connections across requests.
+    `requests` is imported here, so runs that never make an HTTP request don't pay for the import.
+
+    Args:
+        headers (dict): Headers to send with every request.
+        **adapter_kwargs: Arguments for the `HTTPAdapter` mounted for HTTP and HTTPS, e.g. pool sizes or retries.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    if adapter_kwargs:
+        adapter = HTTPAdapter(**adapter_kwargs)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+def make_retry(max_wait, **retry_kwargs):
+    """
+    Creates a urllib3 `Retry` that never waits longer than `max_wait` seconds between two attempts,
+    neither for its own backoff nor for a `Retry-After` header sent by the server.
+
+    Args:
+        max_wait (float): The maximum wait in seconds before a retry.
+        **retry_kwargs: Arguments for the `Retry`, e.g. the number of retries or the retried statuses.
+
+    Returns:
+        urllib3.util.retry.Retry: The configured retry policy.
+    """
+    from urllib3.util.retry import Retry
+
+    class CappedRetry(Retry):
+        def parse_retry_after(self, retry_after):
+            return min(super().parse_retry_after(retry_after), max_wait)
+
+    return CappedRetry(backoff_max=max_wait, **retry_kwargs)
@@ -1,8 +1,11 @@
+import os
+import orjson
 import random
+import re
 import socket
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import subprocess
+from helper.http_session import make_session
 
 # List of services to get public IP from
 IP_SERVICES = [
@@ -19,9 +22,28 @@ IP_SERVICES = [
     {"name": "whatismyip.akamai.com", "url": "https://whatismyip.akamai.com/"}
 ]
 
+# Dotted-quad IPv4 address, octets 0-255 without leading zeros
+IPV4_PATTERN = re.compile(r'(?:(?:25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9])\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9])')
+
+# Log line reporting a failed service, capturing the service name
+SERVICE_FAILURE_PATTERN = re.compile(
+    r'(?:Error|invalid).*?(' + '|'.join(re.escape(service["name"]) for service in IP_SERVICES) + r')'
+)
+
+# Log lines start with the asctime of the log formatter, e.g. 2024-01-01 12:00:00,000
+LOG_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+
+# Number of services queried concurrently and the per-request timeout in seconds
+PARALLEL_SERVICES = 4
+REQUEST_TIMEOUT = 2
+
+# Reliable host used for the connectivity check (Cloudflare's public DNS over TCP)
+CONNECTIVITY_CHECK_HOST = ("1.1.1.1", 53)
+CONNECTIVITY_CHECK_TIMEOUT = 1
+
 def is_network_available(logger):
     """
-    Checks if the network is available by pinging a reliable host.
+    Checks if the network is available by opening a TCP connection to a reliable host.
     
     Args:
         logger (logging.Logger): Logger instance for logging connectivity status.
@@ -30,21 +52,18 @@ def is_network_available(logger):
         bool: True if the network is available, False otherwise.
     """
     try:
-        # Ping Google's public DNS server to check internet connectivity
-        subprocess.check_call(
-            ["ping", "-c", "1", "8.8.8.8"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+        with socket.create_connection(CONNECTIVITY_CHECK_HOST, timeout=CONNECTIVITY_CHECK_TIMEOUT):
+            pass
         logger.info("Network is available.")
         return True
-    except subprocess.CalledProcessError:
+    except OSError:
         logger.error("Network is unavailable. Skipping public IP check.")
         return False
     
 def get_failed_services(logger, log_file_path):
     """
     Checks the log file for services that have failed in the last 24 hours.
+    Only the part of the log written in the last 24 hours is read.
     
     Args:
         logger (logging.Logger): The logger for logging messages.
@@ -57,19 +76,17 @@ def get_failed_services(logger, log_file_path):
     try:
         # Calculate the timestamp for 24 hours ago
         twenty_four_hours_ago = datetime.now() - timedelta(hours=24)
-        with open(log_file_path, 'r') as log_file:
-            for line in log_file:
-                # Check if the line contains error information about a service
-                if 'Error' in line or 'invalid' in line:  # Modify based on your log format for errors
-                    timestamp_str = line.split()[0]  # Assuming timestamp is the first word
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d')  # Adjust format if needed
-                    if timestamp > twenty_four_hours_ago:
-                        # Extract service name from the log line
-                        for service in IP_SERVICES:
-                            if service["name"] in line:
-                                failed_services.add(service["name"])
-                                logger.warning(f"Skipping {service['name']} since it failed in the last 24 hours.")
-                                break
+        with open(log_file_path, 'rb') as log_file:
+            seek_to_time(log_file, twenty_four_hours_ago)
+            lines = log_file.read().decode('utf-8', errors='replace').splitlines()
+
+        for line in lines:
+            # Check if the line contains error information about a service
+            match = SERVICE_FAILURE_PATTERN.search(line)
+            if match:
+                service_name = match.group(1)
+                failed_services.add(service_name)
+                logger.warning(f"Skipping {service_name} since it failed in the last 24 hours.")
     except FileNotFoundError:
         logger.error(f"Log file not found: {log_file_path}")
     except Exception as e:
@@ -77,10 +94,66 @@ def get_failed_services(logger, log_file_path):
     
     return failed_services
 
+def seek_to_time(log_file, cutoff):
+    """
+    Moves the position of a log file to the first line logged at or after `cutoff`.
+    Since log lines are appended in time order, the position is found with a binary search over the file offsets.
+
+    Args:
+        log_file (io.BufferedReader): The log file, opened in binary mode.
+        cutoff (datetime): The earliest time of interest.
+    """
+    log_file.seek(0, os.SEEK_END)
+    low, high = 0, log_file.tell()
+    while low < high:
+        middle = (low + high) // 2
+        timestamp = read_next_timestamp(log_file, middle)
+        if timestamp is None or timestamp >= cutoff:
+            high = middle
+        else:
+            low = middle + 1
+    seek_to_line_start(log_file, low)
+
+def read_next_timestamp(log_file, offset):
+    """
+    Reads the timestamp of the first timestamped line starting at or after `offset`.
+
+    Args:
+        log_file (io.BufferedReader): The log file, opened in binary mode.
+        offset (int): The byte offset to start from.
+
+    Returns:
+        datetime: The timestamp of the line, or None if there is none until the end of the file.
+    """
+    seek_to_line_start(log_file, offset)
+    for line in log_file:
+        try:
+            return datetime.strptime(line[:23].decode('ascii'), LOG_TIMESTAMP_FORMAT)
+        except (UnicodeDecodeError, ValueError):
+            # Skip lines without a timestamp, e.g. continuation lines of multi-line messages
+            continue
+    return None
+
+def seek_to_line_start(log_file, offset):
+    """
+    Moves the position of a log file to the first line starting at or after `offset`.
+
+    Args:
+        log_file (io.BufferedReader): The log file, opened in binary mode.
+        offset (int): The byte offset to start from.
+    """
+    if offset == 0:
+        log_file.seek(0)
+        return
+    # Reading from the byte before `offset` consumes the rest of the line containing it
+    log_file.seek(offset - 1)
+    log_file.readline()
+
 def get_public_ip(logger, log_file):
     """
     Attempts to fetch the public IPv4 address by trying multiple services.
-    Randomly selects the service to avoid overusing one, and skips services that have failed in the last 24 hours.
+    Randomly selects the services to avoid overusing one, and skips services that have failed in the last 24 hours.
+    Services are queried in batches of `PARALLEL_SERVICES`, the first valid answer of a batch wins.
 
     Returns:
         tuple: A tuple containing the public IPv4 address and the service provider name, or None if it could not be fetched.
@@ -96,34 +169,64 @@ def get_public_ip(logger, log_file):
         return None, None
 
     random.shuffle(available_services)
+    session = make_session(pool_connections=len(available_services), pool_maxsize=PARALLEL_SERVICES)
 
-    for service in available_services:
-        try:
-            ip = fetch_ip_from_service(service)
-            if ip and is_valid_ip(ip):
-                return ip, service["name"]
-            logger.warning(f"Received an invalid or IPv6 address from {service['name']}: {ip}, trying the next service.")
-        except Exception as e:
-            logger.error(f"Error fetching public IP from {service['name']}: {e}")
+    for start in range(0, len(available_services), PARALLEL_SERVICES):
+        ip, service_name = race_services(logger, session, available_services[start:start + PARALLEL_SERVICES])
+        if ip:
+            return ip, service_name
 
     logger.error("All attempts to fetch a valid public IPv4 address failed.")
     return None, None
 
-def fetch_ip_from_service(service):
+def race_services(logger, session, services):
+    """
+    Queries the given services concurrently and returns the first valid IPv4 address.
+
+    Args:
+        logger (logging.Logger): The logger for logging messages.
+        session (requests.Session): The session shared by the requests.
+        services (list): The services to query.
+
+    Returns:
+        tuple: A tuple containing the public IPv4 address and the service provider name, or None if no service answered with a valid IPv4.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(services))
+    futures = {executor.submit(fetch_ip_from_service, session, service): service for service in services}
+    try:
+        for future in as_completed(futures):
+            service = futures[future]
+            try:
+                ip = future.result()
+                if ip and is_valid_ip(ip):
+                    return ip, service["name"]
+                logger.warning(f"Received an invalid or IPv6 address from {service['name']}: {ip}, trying the next service.")
+            except Exception as e:
+                logger.error(f"Error fetching public IP from {service['name']}: {e}")
+    finally:
+        # Don't wait for the slower services, their requests are bounded by REQUEST_TIMEOUT
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return None, None
+
+def fetch_ip_from_service(session, service):
     """
     Fetches the public IP address from a given service.
 
     Args:
+        session (requests.Session): The session to send the request with.
         service (dict): The service information containing name and URL.
 
     Returns:
         str: The IP address as a string.
     """
-    response = requests.get(service["url"])
+    response = session.get(service["url"], timeout=REQUEST_TIMEOUT)
     response.raise_for_status()  # Ensure we get a valid response
 
     if service["name"] == "ipinfo.io":
-        return response.json().get("ip")
+        return orjson.loads(response.content).get("ip")
     return response.text.strip()
 
 def is_valid_ip(ip):
@@ -136,8 +239,4 @@ def is_valid_ip(ip):
     Returns:
         bool: True if the IP is valid IPv4, False otherwise.
     """
-    try:
-        socket.inet_pton(socket.AF_INET, ip)
-        return True
-    except socket.error:
-        return False
+    return IPV4_PATTERN.fullmatch(ip) is not None
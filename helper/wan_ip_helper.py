@@ -1,4 +1,5 @@
-import requests
+import orjson
+from helper.http_session import make_session
 
 def get_ipv4(api_url, logger):
     """
@@ -10,15 +11,17 @@ def get_ipv4(api_url, logger):
     Returns:
         tuple: A tuple containing the IPv4 address and the string "wan-ip-provider".
     """
+    import requests
+
     try:
-        response = requests.get(f"{api_url}/ipv4")
+        response = make_session().get(f"{api_url}/ipv4")
         response.raise_for_status()  # Raise an exception for HTTP errors
         
-        data = response.json()
+        data = orjson.loads(response.content)
         if "ipv4" in data:
             return data["ipv4"], "wan-ip-provider"
         else:
             return None, None
-    except requests.RequestException as e:
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
         logger.error(f"Error fetching IPv4: {e}")
         return None, None
\ No newline at end of file
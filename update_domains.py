@@ -1,7 +1,11 @@
-import requests
 import os
+import orjson
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join, dirname
 from dotenv import load_dotenv
+from helper.http_session import make_session, make_retry
 from helper.custom_logger import setup_logger, compress_old_logs, delete_old_gz_logs
 from helper.ip_helper import get_public_ip, is_valid_ip
 from helper.wan_ip_helper import get_ipv4
@@ -14,6 +18,14 @@ load_dotenv(dotenv_path)
 API_KEY = os.environ.get("API_KEY")
 ZONE_ID = os.environ.get("ZONE_ID")
 
+# Maximum number of concurrent DNS record updates
+MAX_UPDATE_WORKERS = 8
+
+# Cloudflare API request timeout and maximum wait before a retry, in seconds.
+# Keeps a throttled run well below the cron interval.
+CLOUDFLARE_TIMEOUT = 10
+CLOUDFLARE_MAX_RETRY_WAIT = 15
+
 # IP Provider settings
 IP_PROVIDER = os.environ.get("IP_PROVIDER")
 WAN_IP_PROVIDER_HOST = os.environ.get("WAN_IP_PROVIDER_HOST")
@@ -22,6 +34,10 @@ WAN_IP_PROVIDER_HOST = os.environ.get("WAN_IP_PROVIDER_HOST")
 log_file = '/var/log/cloudflare/dns_update.log'
 logger = setup_logger(log_file)
 
+# Last public IP that all DNS records of the zone were updated to, and how long it is trusted in seconds
+state_file = '/var/lib/cloudflare-ddns/last_ip'
+STATE_MAX_AGE = 24 * 60 * 60
+
 
 def main():
     """
@@ -37,41 +53,131 @@ def main():
     if public_ip:
         logger.info(f"Current public IP: {public_ip} (from {service_name})")
         
-        # Get the current DNS records
-        dns_records = get_dns_records()
-
-        if not dns_records:
-            logger.warning("No valid DNS records found.")
-            return
-
-        # Iterate over DNS records and update them if the IP has changed
-        for record in dns_records:
-            if record['content'] != public_ip:
-                logger.info(f"IP for {record['name']} has changed. Updating...")
-                update_dns_record(record['id'], public_ip, dns_records)
-            else:
-                logger.info(f"IP for {record['name']} is already up-to-date.")
-        
-    log_dir = os.path.dirname(log_file)
+        # Skip the Cloudflare API entirely if the IP is unchanged since the last recent successful run
+        if public_ip == read_last_ip():
+            logger.info("Public IP has not changed since the last successful update. Skipping DNS records check.")
+        else:
+            session = make_cloudflare_session()
+
+            # Get the current DNS records
+            dns_records = get_dns_records(session)
+
+            if not dns_records:
+                logger.warning("No valid DNS records found.")
+                return
+
+            # Collect the DNS records whose IP has changed
+            stale_records = []
+            for record in dns_records:
+                if record['content'] != public_ip:
+                    logger.info(f"IP for {record['name']} has changed. Updating...")
+                    stale_records.append(record)
+                else:
+                    logger.info(f"IP for {record['name']} is already up-to-date.")
+
+            # Remember the IP once all records point to it
+            if not stale_records or update_dns_records(session, stale_records, public_ip):
+                write_last_ip(public_ip)
+
+    # Compress and clean up old logs without blocking the return of main
+    threading.Thread(target=housekeeping, args=(os.path.dirname(log_file),)).start()
+
+
+def read_last_ip():
+    """
+    Reads the public IP stored by the last successful update.
+    The IP is ignored if it was stored for another zone or more than `STATE_MAX_AGE` seconds ago,
+    so the DNS records are re-checked regularly.
+
+    Returns:
+        str: The last public IP, or None if it is not known or no longer trusted.
+    """
+    try:
+        with open(state_file, 'rb') as f:
+            state = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.warning(f"Error reading the last public IP from {state_file}: {e}")
+        return None
+
+    if not isinstance(state, dict) or state.get("zone_id") != ZONE_ID:
+        return None
+    if time.time() - state.get("updated_at", 0) > STATE_MAX_AGE:
+        return None
+    return state.get("ip")
+
+
+def write_last_ip(ip):
+    """
+    Atomically stores the public IP that all DNS records of the zone point to.
+
+    Args:
+        ip (str): The public IP to store.
+    """
+    tmp_file = state_file + '.tmp'
+    state = {"ip": ip, "zone_id": ZONE_ID, "updated_at": time.time()}
+    try:
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(state))
+        os.replace(tmp_file, state_file)
+    except OSError as e:
+        logger.warning(f"Error writing the last public IP to {state_file}: {e}")
+
+
+def housekeeping(log_dir):
+    """
+    Compresses old logs and deletes outdated compressed logs.
+
+    Args:
+        log_dir (str): The directory where the logs are stored.
+    """
     compress_old_logs(log_dir, 10080, 3) # 1 Week
     delete_old_gz_logs(log_dir, 40320, 4) # 4 Weeks
 
 
-def get_dns_records():
+def make_cloudflare_session():
+    """
+    Creates the session for the Cloudflare API, shared by all requests of a run.
+
+    Returns:
+        requests.Session: The session with the API credentials set.
+    """
+    # Retry rate limits and transient server errors with exponential backoff and jitter.
+    # POST is only used for batch patches, which are safe to repeat.
+    retry = make_retry(
+        CLOUDFLARE_MAX_RETRY_WAIT,
+        total=4,
+        backoff_factor=0.5,
+        backoff_jitter=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "PUT", "POST"]),
+        respect_retry_after_header=True
+    )
+    headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+    return make_session(headers, pool_connections=4, pool_maxsize=8, max_retries=retry)
+
+
+def get_dns_records(session):
     """
     Fetches all DNS records for the specified Cloudflare zone.
 
+    Args:
+        session (requests.Session): The Cloudflare API session.
+
     Returns:
         list: A list of DNS records that have an IPv4 address.
     """
+    import requests
+
     url = f"https://api.cloudflare.com/client/v4/zones/{ZONE_ID}/dns_records"
-    headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, timeout=CLOUDFLARE_TIMEOUT)
         response.raise_for_status()
-        return parse_dns_records(response.json())
-    except requests.exceptions.RequestException as e:
+        return parse_dns_records(orjson.loads(response.content))
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.error(f"Error fetching DNS records: {e}")
         return []
 
@@ -104,22 +210,57 @@ def parse_dns_records(data):
     return dns_records
 
 
-def update_dns_record(record_id, new_ip, dns_records):
+def update_dns_records(session, records, new_ip):
+    """
+    Updates several DNS records in Cloudflare with the new IP address using a single batch request.
+    Falls back to updating the records one by one if there is only one record or the batch request fails.
+
+    Args:
+        session (requests.Session): The Cloudflare API session.
+        records (list): The DNS records to update, as returned by `parse_dns_records`.
+        new_ip (str): The new IP address to set.
+
+    Returns:
+        bool: True if all records were updated, False otherwise.
+    """
+    import requests
+
+    if len(records) > 1:
+        url = f"https://api.cloudflare.com/client/v4/zones/{ZONE_ID}/dns_records/batch"
+        data = {"patches": [{"id": record["id"], "content": new_ip} for record in records]}
+
+        try:
+            response = session.post(url, data=orjson.dumps(data), timeout=CLOUDFLARE_TIMEOUT)
+            response.raise_for_status()
+            result = orjson.loads(response.content)
+            if result.get("success"):
+                for record in records:
+                    logger.info(f"Successfully updated DNS record {record['name']} to IP {new_ip}")
+                return True
+            logger.warning(f"Error batch updating DNS records: {result.get('errors')}. Updating them one by one.")
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.warning(f"Error batch updating DNS records: {e}. Updating them one by one.")
+
+    # Batches are applied atomically, so after a failure all records still need updating
+    with ThreadPoolExecutor(max_workers=min(MAX_UPDATE_WORKERS, len(records))) as executor:
+        return all(executor.map(lambda record: update_dns_record(session, record, new_ip), records))
+
+
+def update_dns_record(session, record, new_ip):
     """
     Updates a DNS record in Cloudflare with the new IP address.
 
     Args:
-        record_id (str): The ID of the DNS record to update.
+        session (requests.Session): The Cloudflare API session.
+        record (dict): The DNS record to update, as returned by `parse_dns_records`.
         new_ip (str): The new IP address to set.
-        dns_records (list): The list of DNS records containing the record to update.
+
+    Returns:
+        bool: True if the record was updated, False otherwise.
     """
-    record = next((r for r in dns_records if r["id"] == record_id), None)
-    if not record:
-        logger.error(f"Record with ID {record_id} not found.")
-        return
+    import requests
 
-    url = f"https://api.cloudflare.com/client/v4/zones/{ZONE_ID}/dns_records/{record_id}"
-    headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+    url = f"https://api.cloudflare.com/client/v4/zones/{ZONE_ID}/dns_records/{record['id']}"
 
     data = {
         "name": record["name"],
@@ -130,15 +271,16 @@ def update_dns_record(record_id, new_ip, dns_records):
     }
 
     try:
-        response = requests.put(url, json=data, headers=headers)
+        response = session.put(url, data=orjson.dumps(data), timeout=CLOUDFLARE_TIMEOUT)
         response.raise_for_status()
-        result = response.json()
+        result = orjson.loads(response.content)
         if result.get("success"):
             logger.info(f"Successfully updated DNS record {record['name']} to IP {new_ip}")
-        else:
-            logger.error(f"Error updating DNS record {record['name']}: {result.get('errors')}")
-    except requests.exceptions.RequestException as e:
+            return True
+        logger.error(f"Error updating DNS record {record['name']}: {result.get('errors')}")
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         logger.error(f"Error updating DNS record {record['name']}: {e}")
+    return False
 
 
 if __name__ == "__main__":